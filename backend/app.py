@@ -7,10 +7,145 @@ from flask_cors import CORS
 import cv2
 import pickle
 import random
+import threading
+import functools
+import math
+import numbers
 
 app = Flask(__name__)
 CORS(app)  
 
+# Admission control: bounded concurrency and queue depth per route class so that
+# traffic spikes are rejected fast with 503 instead of piling up behind slow work
+class AdmissionController:
+    def __init__(self, name, max_concurrency, max_queue, deadline):
+        prefix = f'ADMISSION_{name.upper()}_'
+        if max_concurrency < 1:
+            raise ValueError(f"{prefix}CONCURRENCY must be at least 1, got {max_concurrency}")
+        if max_queue < 0:
+            raise ValueError(f"{prefix}QUEUE must not be negative, got {max_queue}")
+        if deadline <= 0:
+            raise ValueError(f"{prefix}DEADLINE must be positive, got {deadline}")
+
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.deadline = deadline  # seconds a request may wait for a slot
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.active = 0
+        self.queued = 0
+        self.avg_service_time = 0.0  # exponentially weighted moving average
+        self.admitted = 0
+        self.completed = 0
+        self.rejected_queue_full = 0
+        self.rejected_deadline = 0
+        self.rejected_timeout = 0  # admitted to the queue but no slot freed in time
+
+    # Wait for the request at the given queue position: every slot has to finish
+    # a whole request for each batch of max_concurrency requests ahead of it.
+    # Must be called with self.lock held
+    def _estimated_wait(self, position):
+        return math.ceil((position + 1) / self.max_concurrency) * self.avg_service_time
+
+    # Returns None if the request was admitted, otherwise a Retry-After in seconds
+    def acquire(self):
+        with self.lock:
+            # Take a free slot directly unless others are already waiting for one
+            if self.queued == 0 and self.slots.acquire(blocking=False):
+                self.active += 1
+                self.admitted += 1
+                return None
+            if self.queued >= self.max_queue:
+                self.rejected_queue_full += 1
+                return self._retry_after(self.queued)
+            if self._estimated_wait(self.queued) >= self.deadline:
+                self.rejected_deadline += 1
+                return self._retry_after(self.queued)
+            self.queued += 1
+
+        acquired = self.slots.acquire(timeout=self.deadline)
+
+        with self.lock:
+            self.queued -= 1
+            if not acquired:
+                self.rejected_timeout += 1
+                return self._retry_after(self.queued)
+            self.active += 1
+            self.admitted += 1
+        return None
+
+    def release(self, service_time):
+        with self.lock:
+            self.active -= 1
+            self.completed += 1
+            if self.avg_service_time == 0:
+                self.avg_service_time = service_time
+            else:
+                self.avg_service_time = 0.8 * self.avg_service_time + 0.2 * service_time
+        self.slots.release()
+
+    # Must be called with self.lock held
+    def _retry_after(self, position):
+        return max(1, math.ceil(self._estimated_wait(position)))
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'max_concurrency': self.max_concurrency,
+                'max_queue': self.max_queue,
+                'deadline': self.deadline,
+                'active': self.active,
+                'queued': self.queued,
+                'avg_service_time': round(self.avg_service_time, 4),
+                'estimated_wait': round(self._estimated_wait(self.queued) if self.active >= self.max_concurrency else 0.0, 4),
+                'admitted': self.admitted,
+                'completed': self.completed,
+                'rejected_queue_full': self.rejected_queue_full,
+                'rejected_deadline': self.rejected_deadline,
+                'rejected_timeout': self.rejected_timeout
+            }
+
+# Limits per route class, overridable with e.g. ADMISSION_INFERENCE_CONCURRENCY
+def create_admission_controller(name, max_concurrency, max_queue, deadline):
+    prefix = f'ADMISSION_{name.upper()}_'
+    return AdmissionController(
+        name,
+        int(os.environ.get(prefix + 'CONCURRENCY', max_concurrency)),
+        int(os.environ.get(prefix + 'QUEUE', max_queue)),
+        float(os.environ.get(prefix + 'DEADLINE', deadline))
+    )
+
+admission_controllers = {
+    'inference': create_admission_controller('inference', 4, 16, 2.0),
+    'capture': create_admission_controller('capture', 1, 1, 45.0),  # one camera
+    'storage': create_admission_controller('storage', 8, 32, 1.0)
+}
+
+# Decorator that runs a view under the admission controller of its route class
+def admission_controlled(route_class):
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            controller = admission_controllers[route_class]
+            retry_after = controller.acquire()
+            if retry_after is not None:
+                response = jsonify({
+                    'error': 'Server is overloaded, please retry later',
+                    'route_class': route_class,
+                    'retry_after': retry_after
+                })
+                response.status_code = 503
+                response.headers['Retry-After'] = str(retry_after)
+                return response
+            start_time = time.time()
+            try:
+                return view(*args, **kwargs)
+            finally:
+                controller.release(time.time() - start_time)
+        return wrapper
+    return decorator
+
 
 model_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'mmnn_fatigue_model.onnx')
 session = ort.InferenceSession(model_path)
@@ -93,6 +228,7 @@ def process_eye_frame(frame, prev_eyes_data=None):
 
 # Function to capture eye data only when needed
 @app.route('/api/start-eye-tracking', methods=['POST'])
+@admission_controlled('capture')
 def start_eye_tracking():
     try:
         # Get parameters from the request
@@ -320,7 +456,14 @@ def save_results(data, filename='results.pkl'):
 def health_check():
     return jsonify({'status': 'ok'})
 
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    return jsonify({
+        'admission': {name: controller.snapshot() for name, controller in admission_controllers.items()}
+    })
+
 @app.route('/api/fatigue-data', methods=['GET'])
+@admission_controlled('storage')
 def get_fatigue_data():
     # DO NOT activate camera here, just return existing data or mock data
     try:
@@ -386,6 +529,7 @@ def generate_activity_log():
     return activities
 
 @app.route('/api/predict', methods=['POST'])
+@admission_controlled('inference')
 def predict():
     try:
         data = request.json
@@ -471,6 +615,7 @@ def predict():
         return jsonify({'error': str(e)}), 400
 
 @app.route('/api/activity', methods=['POST'])
+@admission_controlled('storage')
 def log_activity():
     try:
         data = request.json
@@ -482,6 +627,7 @@ def log_activity():
 
 # Function to save test results for various tests
 @app.route('/api/save-test-results', methods=['POST'])
+@admission_controlled('storage')
 def save_test_results():
     try:
         data = request.json
@@ -494,6 +640,7 @@ def save_test_results():
 
 # Example usage for saving multitasking test results
 @app.route('/api/save-multitasking-results', methods=['POST'])
+@admission_controlled('storage')
 def save_multitasking_results():
     try:
         data = request.json
@@ -504,6 +651,7 @@ def save_multitasking_results():
 
 # Add similar endpoints for reaction, typing, memory, and math tests
 @app.route('/api/save-reaction-results', methods=['POST'])
+@admission_controlled('storage')
 def save_reaction_results():
     try:
         data = request.json
@@ -513,6 +661,7 @@ def save_reaction_results():
         return jsonify({'error': str(e)}), 400
 
 @app.route('/api/save-typing-results', methods=['POST'])
+@admission_controlled('storage')
 def save_typing_results():
     try:
         data = request.json
@@ -522,6 +671,7 @@ def save_typing_results():
         return jsonify({'error': str(e)}), 400
 
 @app.route('/api/save-memory-results', methods=['POST'])
+@admission_controlled('storage')
 def save_memory_results():
     try:
         data = request.json
@@ -531,6 +681,7 @@ def save_memory_results():
         return jsonify({'error': str(e)}), 400
 
 @app.route('/api/save-math-results', methods=['POST'])
+@admission_controlled('storage')
 def save_math_results():
     try:
         data = request.json
@@ -597,17 +748,32 @@ def calculate_fatigue_score_from_metrics(eye_metrics):
     
     return {'fatigue_score': fatigue_score, 'fatigue_level': fatigue_level}
 
+# Weights for different test types, in the order scores are combined
+fatigue_weights = {
+    'multitasking': 0.25,
+    'reaction': 0.15,
+    'typing': 0.15,
+    'memory': 0.20,
+    'math': 0.15,
+    'eye': 0.10
+}
+
+fatigue_thresholds = {
+    # Blink rate bands (upper bounds in blinks per minute) and their scores;
+    # rates at or above the last bound get the last score
+    'blink_rate_bounds': [10, 15, 20],
+    'blink_rate_scores': [80, 60, 40, 20],
+    # Overall scores above these are High and Moderate fatigue
+    'high': 70,
+    'moderate': 40
+}
+
 # Function to calculate fatigue score
-def calculate_fatigue_score(data):
-    # Define weights for different test types
-    weights = {
-        'multitasking': 0.25,
-        'reaction': 0.15,
-        'typing': 0.15,
-        'memory': 0.20,
-        'math': 0.15,
-        'eye': 0.10
-    }
+def calculate_fatigue_score(data, weights=None, thresholds=None):
+    if weights is None:
+        weights = fatigue_weights
+    if thresholds is None:
+        thresholds = fatigue_thresholds
     
     # Initialize scores
     scores = {}
@@ -663,14 +829,11 @@ def calculate_fatigue_score(data):
             # Apply the same calculation as in calculate_fatigue_score_from_metrics
             blink_rate = eye_data.get('blink_rate')
             if blink_rate is not None:
-                if blink_rate < 10:
-                    eye_score = 80
-                elif blink_rate < 15:
-                    eye_score = 60
-                elif blink_rate < 20:
-                    eye_score = 40
-                else:
-                    eye_score = 20
+                eye_score = thresholds['blink_rate_scores'][-1]
+                for bound, score in zip(thresholds['blink_rate_bounds'], thresholds['blink_rate_scores']):
+                    if blink_rate < bound:
+                        eye_score = score
+                        break
                 scores['eye'] = eye_score
     
     # Calculate weighted average
@@ -690,9 +853,9 @@ def calculate_fatigue_score(data):
     
     # Determine fatigue level
     fatigue_level = "Low"
-    if overall_score > 70:
+    if overall_score > thresholds['high']:
         fatigue_level = "High"
-    elif overall_score > 40:
+    elif overall_score > thresholds['moderate']:
         fatigue_level = "Moderate"
     
     return {
@@ -701,8 +864,175 @@ def calculate_fatigue_score(data):
         'test_scores': scores
     }
 
+# Metric each test type is scored from and its default when the metric is missing
+fatigue_metric_fields = {
+    'multitasking': ('multitaskingIndex', 50),
+    'reaction': ('averageReactionTime', 300),
+    'typing': ('wpm', 50),
+    'memory': ('score', 50),
+    'math': ('score', 50),
+    'eye': ('blink_rate', None)
+}
+
+# Bulk re-scoring: build the columns once with build_fatigue_columns, then call
+# score_fatigue_columns on them for every weight or threshold set being tried:
+#
+#   columns = build_fatigue_columns(user_data)
+#   for weights in candidate_weights:
+#       result = score_fatigue_columns(columns, weights, thresholds)
+#
+# Building the columns loops over every user in Python, so it should not be
+# repeated per scoring pass; scoring is a handful of NumPy operations.
+
+# Build a columnar representation of many users' test data, where user_data maps
+# a user ID to the same {test_type: results} dict calculate_fatigue_score takes.
+# Each test type gets one array of metric values, a mask of users that have it and
+# a mask of metrics stored as integers, so results can keep the scalar's types.
+def build_fatigue_columns(user_data):
+    user_ids = list(user_data.keys())
+    values = {}
+    present = {}
+    integral = {}
+
+    for test_type, (field, default) in fatigue_metric_fields.items():
+        column = np.zeros(len(user_ids))
+        mask = np.zeros(len(user_ids), dtype=bool)
+        integral_mask = np.zeros(len(user_ids), dtype=bool)
+
+        for i, user_id in enumerate(user_ids):
+            test_data = user_data[user_id].get(test_type)
+            if not test_data:
+                continue
+            if test_type == 'eye':
+                if isinstance(test_data, list):
+                    # Use the first element if it's a list
+                    test_data = test_data[0]
+                if test_data.get(field) is None:
+                    continue
+            value = test_data.get(field, default)
+            # calculate_fatigue_score raises on non-numeric metrics, so don't coerce them
+            if not isinstance(value, numbers.Real):
+                raise TypeError(f"{test_type} {field} must be a number, got {type(value).__name__}")
+            column[i] = value
+            mask[i] = True
+            integral_mask[i] = isinstance(value, numbers.Integral)
+
+        values[test_type] = column
+        present[test_type] = mask
+        integral[test_type] = integral_mask
+
+    return {'user_ids': user_ids, 'values': values, 'present': present, 'integral': integral}
+
+# Clip metrics to 0-100 the same way min(100, max(0, x)) does, which maps NaN to 0
+def clip_scores(values):
+    return np.clip(np.where(np.isnan(values), 0, values), 0, 100)
+
+# Vectorized calculate_fatigue_score over the columns from build_fatigue_columns,
+# used to re-score every user in one pass when weights or thresholds change.
+# Returns arrays indexed like columns['user_ids']; test_scores are only meaningful
+# where present is set, and integral_scores marks where the scalar returns an int.
+def score_fatigue_columns(columns, weights=None, thresholds=None):
+    if weights is None:
+        weights = fatigue_weights
+    if thresholds is None:
+        thresholds = fatigue_thresholds
+
+    values = columns['values']
+    present = columns['present']
+    integral = columns['integral']
+
+    # Blink rate band of each user; the last band covers rates at or above the last bound
+    blink_rate_bounds = thresholds['blink_rate_bounds']
+    blink_rate_scores = thresholds['blink_rate_scores']
+    blink_rate_bands = np.select(
+        [values['eye'] < bound for bound in blink_rate_bounds],
+        range(len(blink_rate_bounds)),
+        default=len(blink_rate_bounds)
+    )
+
+    # Component scores, in the same order calculate_fatigue_score combines them
+    scores = {
+        'multitasking': 100 - clip_scores(values['multitasking']),
+        'reaction': clip_scores((values['reaction'] - 150) / 3),
+        'typing': 100 - clip_scores(values['typing']),
+        'memory': 100 - clip_scores(values['memory']),
+        'math': 100 - clip_scores(values['math']),
+        'eye': np.array(blink_rate_scores, dtype=float)[blink_rate_bands]
+    }
+
+    # Weighted mean over the tests each user has taken
+    user_count = len(columns['user_ids'])
+    weighted_sum = np.zeros(user_count)
+    total_weight = np.zeros(user_count)
+
+    for test_type, test_scores in scores.items():
+        test_weight = weights.get(test_type, 0)
+        mask = present[test_type]
+        weighted_sum = np.where(mask, weighted_sum + test_scores * test_weight, weighted_sum)
+        total_weight = np.where(mask, total_weight + test_weight, total_weight)
+
+    # min(100, max(0, x)) returns the int bound when x is clipped (or NaN), so a
+    # component is an int in calculate_fatigue_score unless a float metric fell
+    # strictly inside the range
+    def clipped_to_bound(unclipped):
+        return np.isnan(unclipped) | (unclipped <= 0) | (unclipped >= 100)
+
+    reaction_unclipped = (values['reaction'] - 150) / 3
+    integral_scores = {
+        'multitasking': integral['multitasking'] | clipped_to_bound(values['multitasking']),
+        'reaction': clipped_to_bound(reaction_unclipped),
+        'typing': integral['typing'] | clipped_to_bound(values['typing']),
+        'memory': integral['memory'] | clipped_to_bound(values['memory']),
+        'math': integral['math'] | clipped_to_bound(values['math']),
+        'eye': np.array([isinstance(score, numbers.Integral) for score in blink_rate_scores])[blink_rate_bands]
+    }
+
+    has_weight = total_weight > 0
+    overall_scores = np.where(has_weight, weighted_sum / np.where(has_weight, total_weight, 1), 50)
+
+    fatigue_levels = np.select(
+        [overall_scores > thresholds['high'], overall_scores > thresholds['moderate']],
+        ['High', 'Moderate'],
+        default='Low'
+    )
+
+    return {
+        'user_ids': columns['user_ids'],
+        'fatigue_score': np.round(overall_scores).astype(int),
+        'fatigue_level': fatigue_levels,
+        'test_scores': scores,
+        'present': present,
+        'integral_scores': integral_scores
+    }
+
+# Re-score all users, returning the same result dict per user as calculate_fatigue_score,
+# including int or float component scores (test_rescore.py checks the two stay in sync).
+# Building the columns and the per-user dicts dominates its run time, so use
+# build_fatigue_columns and score_fatigue_columns directly to try many weight sets.
+def rescore_all_users(user_data, weights=None, thresholds=None):
+    result = score_fatigue_columns(build_fatigue_columns(user_data), weights, thresholds)
+
+    fatigue_scores = result['fatigue_score'].tolist()
+    fatigue_levels = result['fatigue_level'].tolist()
+    test_scores = {test_type: scores.tolist() for test_type, scores in result['test_scores'].items()}
+    present = {test_type: mask.tolist() for test_type, mask in result['present'].items()}
+    integral_scores = {test_type: mask.tolist() for test_type, mask in result['integral_scores'].items()}
+
+    user_results = {}
+    for i, user_id in enumerate(result['user_ids']):
+        user_results[user_id] = {
+            'fatigue_score': fatigue_scores[i],
+            'fatigue_level': fatigue_levels[i],
+            'test_scores': {
+                test_type: int(test_scores[test_type][i]) if integral_scores[test_type][i] else test_scores[test_type][i]
+                for test_type in test_scores if present[test_type][i]
+            }
+        }
+    return user_results
+
 # Endpoint to trigger fatigue analysis
 @app.route('/api/fatigue-analysis', methods=['GET'])
+@admission_controlled('storage')
 def fatigue_analysis():
     result = perform_fatigue_analysis()
     return jsonify(result)
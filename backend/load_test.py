@@ -0,0 +1,279 @@
+import argparse
+import csv
+import itertools
+import json
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Load generator that replays user journeys against the Flask API to find the
+# saturation point of the backend for capacity planning.
+#
+# Usage:
+#   python load_test.py                                  # starts a local test server
+#   python load_test.py --base-url http://localhost:5000 # targets a running server
+
+default_dataset_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fatigue_dataset.csv')
+
+# Routes in the order a user journey visits them
+journey_routes = [
+    ('POST', '/api/save-reaction-results'),
+    ('POST', '/api/save-typing-results'),
+    ('POST', '/api/save-memory-results'),
+    ('POST', '/api/save-math-results'),
+    ('POST', '/api/save-multitasking-results'),
+    ('POST', '/api/predict'),
+    ('GET', '/api/fatigue-analysis'),
+    ('GET', '/api/fatigue-data')
+]
+
+# Load the feature rows of fatigue_dataset.csv as dicts of floats
+def load_dataset(path):
+    rows = []
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            rows.append({key: float(value) for key, value in row.items() if key != 'Fatigue_Level'})
+    return rows
+
+# Create synthetic users whose features are sampled from the dataset
+def generate_users(rows, user_count, rng):
+    users = []
+    for i in range(user_count):
+        users.append({
+            'user_id': f'loadtest-user-{i:05d}',
+            'features': rng.choice(rows)
+        })
+    return users
+
+# Build the request bodies of a journey in the same shape the frontend sends
+def build_payloads(user):
+    user_id = user['user_id']
+    features = user['features']
+    reaction_ms = (features['Fastest_Reaction'] + features['Slowest_Reaction']) / 2 * 1000
+    return {
+        '/api/save-reaction-results': {
+            'userId': user_id,
+            'averageReactionTime': round(reaction_ms),
+            'fastestReactionTime': round(features['Fastest_Reaction'] * 1000),
+            'slowestReactionTime': round(features['Slowest_Reaction'] * 1000)
+        },
+        '/api/save-typing-results': {
+            'userId': user_id,
+            'wpm': round(features['WPM']),
+            'accuracy': round(features['Typing_Accuracy'], 1)
+        },
+        '/api/save-memory-results': {
+            'userId': user_id,
+            'score': round(features['Memory_Accuracy'], 1),
+            'correctSequences': int(features['Correct_Sequences'])
+        },
+        '/api/save-math-results': {
+            'userId': user_id,
+            'score': round(features['Math_Accuracy'], 1),
+            'problemsAttempted': int(features['Problems_Attempted']),
+            'correctAnswers': int(features['Math_Correct']),
+            'averageResponseTime': round(features['Math_Response_Time'], 2)
+        },
+        '/api/save-multitasking-results': {
+            'userId': user_id,
+            'multitaskingIndex': round(features['Multitasking_Index'] * 100),
+            'targetsClicked': int(features['Targets_Clicked']),
+            'equationsSolved': int(features['Equations_Solved']),
+            'equationAccuracy': round(features['Equation_Accuracy'], 1)
+        },
+        '/api/predict': {
+            'userId': user_id,
+            'features': features
+        }
+    }
+
+# Send one request and return (status, latency in seconds); status 0 means a connection error
+def send_request(base_url, method, route, payload, timeout):
+    data = None
+    headers = {}
+    if payload is not None:
+        data = json.dumps(payload).encode('utf-8')
+        headers['Content-Type'] = 'application/json'
+    req = urllib.request.Request(base_url + route, data=data, headers=headers, method=method)
+
+    start_time = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except (urllib.error.URLError, OSError):
+        status = 0
+    return status, time.perf_counter() - start_time
+
+def run_journey(base_url, user, timeout):
+    payloads = build_payloads(user)
+    samples = []
+    for method, route in journey_routes:
+        status, latency = send_request(base_url, method, route, payloads.get(route), timeout)
+        samples.append((route, status, latency))
+    return samples
+
+# Run a fixed number of journeys with the given number of concurrent users, taking
+# the next users from user_cycle so every journey uses a distinct user ID until
+# the whole population has been visited
+def run_level(base_url, user_cycle, concurrency, journeys, timeout):
+    journey_users = list(itertools.islice(user_cycle, journeys))
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda user: run_journey(base_url, user, timeout), journey_users))
+    elapsed = time.perf_counter() - start_time
+    samples = [sample for journey in results for sample in journey]
+    return summarize_level(concurrency, journeys, samples, elapsed)
+
+def summarize_level(concurrency, journeys, samples, elapsed):
+    routes = {}
+    for route, status, latency in samples:
+        routes.setdefault(route, []).append((status, latency))
+
+    route_stats = {}
+    for route, route_samples in routes.items():
+        latencies_ms = np.array([latency for _, latency in route_samples]) * 1000
+        errors = sum(1 for status, _ in route_samples if status < 200 or status >= 400)
+        shed = sum(1 for status, _ in route_samples if status == 503)
+        p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+        route_stats[route] = {
+            'requests': len(route_samples),
+            'p50_ms': round(float(p50), 1),
+            'p95_ms': round(float(p95), 1),
+            'p99_ms': round(float(p99), 1),
+            'error_rate': round(errors / len(route_samples), 4),
+            'shed_rate': round(shed / len(route_samples), 4)
+        }
+
+    total_errors = sum(1 for _, status, _ in samples if status < 200 or status >= 400)
+    total_shed = sum(1 for _, status, _ in samples if status == 503)
+    return {
+        'concurrency': concurrency,
+        'journeys': journeys,
+        'elapsed': round(elapsed, 2),
+        'journeys_per_second': round(journeys / elapsed, 2) if elapsed > 0 else 0,
+        'requests_per_second': round(len(samples) / elapsed, 2) if elapsed > 0 else 0,
+        'error_rate': round(total_errors / len(samples), 4) if samples else 0,
+        'shed_rate': round(total_shed / len(samples), 4) if samples else 0,
+        'routes': route_stats
+    }
+
+# The saturation point is the last healthy level before throughput stops growing or
+# errors appear. Returns it (None if even the first level fails) together with the
+# first level past saturation and why it failed: 'plateau', 'load shedding' when
+# the errors are mostly 503s shed by admission control, or 'errors'.
+def find_saturation_point(levels, min_gain=0.05, max_error_rate=0.01):
+    previous = None
+    for level in levels:
+        if level['error_rate'] > max_error_rate:
+            unshed_error_rate = round(level['error_rate'] - level['shed_rate'], 4)
+            cause = 'load shedding' if unshed_error_rate <= max_error_rate else 'errors'
+            return {
+                'saturation_point': previous['concurrency'] if previous is not None else None,
+                'first_failing': level['concurrency'],
+                'cause': cause
+            }
+        if previous is not None and level['requests_per_second'] < previous['requests_per_second'] * (1 + min_gain):
+            return {
+                'saturation_point': previous['concurrency'],
+                'first_failing': level['concurrency'],
+                'cause': 'plateau'
+            }
+        previous = level
+    return None
+
+def print_level(level):
+    print(f"\nConcurrency {level['concurrency']}: {level['journeys']} journeys in {level['elapsed']}s, "
+          f"{level['journeys_per_second']} journeys/s, {level['requests_per_second']} req/s, "
+          f"error rate {level['error_rate']:.2%} (shed {level['shed_rate']:.2%})")
+    print(f"  {'route':<34}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>10}{'shed':>10}")
+    for route, stats in level['routes'].items():
+        print(f"  {route:<34}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}"
+              f"{stats['error_rate']:>10.2%}{stats['shed_rate']:>10.2%}")
+
+# Start the Flask app on a free local port; it writes its .pkl files into the current directory
+def start_local_server():
+    from werkzeug.serving import make_server
+    from app import app
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay user journeys against the fatigue API at increasing concurrency')
+    parser.add_argument('--base-url', help='URL of a running backend; a local test server is started if omitted')
+    parser.add_argument('--dataset', default=default_dataset_path, help='CSV to sample user features from')
+    parser.add_argument('--users', type=int, default=2000, help='number of synthetic user IDs')
+    parser.add_argument('--concurrency', default='1,2,4,8,16,32,64', help='comma separated concurrency levels')
+    parser.add_argument('--journeys', type=int, help='journeys to run at each concurrency level; '
+                        'defaults to enough to visit every user once across all levels')
+    parser.add_argument('--timeout', type=float, default=30.0, help='per request timeout in seconds')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the report as JSON to this file')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    users = generate_users(load_dataset(args.dataset), args.users, rng)
+    concurrency_levels = [int(level) for level in args.concurrency.split(',')]
+    journeys = args.journeys or math.ceil(len(users) / len(concurrency_levels))
+
+    user_cycle = itertools.cycle(users)
+
+    server = None
+    original_cwd = os.getcwd()
+    work_dir = None
+    base_url = args.base_url
+    levels = []
+    try:
+        if base_url is None:
+            # Keep the result files written by the app out of the source tree
+            work_dir = tempfile.TemporaryDirectory()
+            os.chdir(work_dir.name)
+            server, base_url = start_local_server()
+
+        print(f'Running {len(journey_routes)}-request journeys for {len(users)} users against {base_url}')
+        for concurrency in concurrency_levels:
+            level = run_level(base_url, user_cycle, concurrency, journeys, args.timeout)
+            print_level(level)
+            levels.append(level)
+    finally:
+        if server is not None:
+            server.shutdown()
+        if work_dir is not None:
+            os.chdir(original_cwd)
+            work_dir.cleanup()
+
+    saturation = find_saturation_point(levels)
+    if saturation is None:
+        print('\nNo saturation point reached; try higher concurrency levels')
+    else:
+        causes = {
+            'plateau': 'throughput stopped growing',
+            'load shedding': 'admission control shed requests with 503',
+            'errors': 'requests failed'
+        }
+        if saturation['saturation_point'] is None:
+            print('\nSaturated at the first level; try lower concurrency levels')
+        else:
+            print(f"\nSaturation point: {saturation['saturation_point']} concurrent users")
+        print(f"First saturated level: {saturation['first_failing']} concurrent users "
+              f"({causes[saturation['cause']]})")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'levels': levels, 'saturation': saturation}, f, indent=2)
+
+if __name__ == '__main__':
+    main()
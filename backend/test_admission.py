@@ -0,0 +1,87 @@
+import threading
+import time
+
+import pytest
+
+from app import AdmissionController
+
+# Checks the admission decisions of AdmissionController. Run with: pytest test_admission.py
+
+def test_free_slot_is_taken_directly():
+    controller = AdmissionController('test', 2, 0, 1.0)
+
+    assert controller.acquire() is None
+    assert controller.acquire() is None
+
+    snapshot = controller.snapshot()
+    assert snapshot['active'] == 2
+    assert snapshot['queued'] == 0
+    assert snapshot['admitted'] == 2
+
+def test_full_queue_is_rejected():
+    controller = AdmissionController('test', 1, 1, 5.0)
+    assert controller.acquire() is None
+
+    # Holds the only queue place until the slot is released
+    waiter = threading.Thread(target=controller.acquire)
+    waiter.start()
+    while controller.snapshot()['queued'] == 0:
+        time.sleep(0.01)
+
+    retry_after = controller.acquire()
+    assert retry_after is not None and retry_after >= 1
+    assert controller.snapshot()['rejected_queue_full'] == 1
+
+    controller.release(0.1)
+    waiter.join()
+    assert controller.snapshot()['admitted'] == 2
+
+def test_estimated_wait_at_deadline_is_rejected():
+    controller = AdmissionController('test', 1, 4, 1.0)
+    assert controller.acquire() is None
+    controller.release(1.0)  # average service time is now 1.0s
+    assert controller.acquire() is None
+
+    start_time = time.time()
+    retry_after = controller.acquire()
+
+    # Rejected without waiting for the slot
+    assert time.time() - start_time < 0.5
+    assert retry_after >= 1
+    snapshot = controller.snapshot()
+    assert snapshot['rejected_deadline'] == 1
+    assert snapshot['rejected_timeout'] == 0
+
+def test_slot_not_freed_before_deadline_times_out():
+    controller = AdmissionController('test', 1, 4, 0.2)
+    assert controller.acquire() is None
+
+    # No service time measured yet, so the request is queued and times out
+    retry_after = controller.acquire()
+
+    assert retry_after >= 1
+    snapshot = controller.snapshot()
+    assert snapshot['rejected_timeout'] == 1
+    assert snapshot['queued'] == 0
+
+def test_queued_request_gets_released_slot():
+    controller = AdmissionController('test', 1, 4, 2.0)
+    assert controller.acquire() is None
+
+    releaser = threading.Timer(0.1, controller.release, args=(0.1,))
+    releaser.start()
+    assert controller.acquire() is None
+    releaser.join()
+
+    snapshot = controller.snapshot()
+    assert snapshot['admitted'] == 2
+    assert snapshot['active'] == 1
+
+@pytest.mark.parametrize('max_concurrency, max_queue, deadline', [
+    (0, 2, 1.0),
+    (1, -1, 1.0),
+    (1, 2, 0)
+])
+def test_invalid_limits_are_rejected(max_concurrency, max_queue, deadline):
+    with pytest.raises(ValueError):
+        AdmissionController('test', max_concurrency, max_queue, deadline)
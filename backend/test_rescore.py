@@ -0,0 +1,104 @@
+import json
+import random
+import time
+
+import pytest
+
+from app import build_fatigue_columns, calculate_fatigue_score, rescore_all_users, score_fatigue_columns
+
+# Checks that the vectorized rescore_all_users gives the same results, including
+# int/float types, as calculate_fatigue_score. Run with: pytest test_rescore.py
+
+custom_weights = [
+    None,
+    {'multitasking': 0.5, 'reaction': 0.1, 'typing': 0.1, 'memory': 0.1, 'math': 0.1, 'eye': 0.3},
+    {'eye': 1.0},
+    {'multitasking': 0, 'reaction': 0, 'typing': 0, 'memory': 0, 'math': 0, 'eye': 0}
+]
+
+custom_thresholds = [
+    None,
+    {'blink_rate_bounds': [8, 12, 18, 25], 'blink_rate_scores': [90, 70, 50, 30, 10], 'high': 65, 'moderate': 35},
+    {'blink_rate_bounds': [10, 15, 20], 'blink_rate_scores': [80.5, 60, 40.25, 20], 'high': 70.5, 'moderate': 40.5}
+]
+
+def sample_metric(rng, low, high):
+    r = rng.random()
+    if r < 0.03:
+        return float('nan')
+    if r < 0.05:
+        return rng.choice([float('inf'), -float('inf')])
+    if r < 0.3:
+        return rng.randint(int(low), int(high))
+    return rng.uniform(low, high)
+
+def sample_user(rng):
+    data = {}
+    if rng.random() < 0.8:
+        data['multitasking'] = rng.choice([{'multitaskingIndex': sample_metric(rng, -20, 120)}, {'other': 1}])
+    if rng.random() < 0.8:
+        data['reaction'] = {'averageReactionTime': sample_metric(rng, 100, 600)}
+    if rng.random() < 0.8:
+        data['typing'] = {'wpm': sample_metric(rng, -5, 130)}
+    if rng.random() < 0.8:
+        data['memory'] = {'score': sample_metric(rng, 0, 100)}
+    if rng.random() < 0.8:
+        data['math'] = rng.choice([{'score': sample_metric(rng, 0, 100)}, {}, None])
+    if rng.random() < 0.8:
+        eye = {'blink_rate': rng.choice([None, sample_metric(rng, 0, 30), 10, 15, 20])}
+        data['eye'] = rng.choice([eye, [eye], []])
+    return data
+
+@pytest.mark.parametrize('thresholds', custom_thresholds)
+@pytest.mark.parametrize('weights', custom_weights)
+def test_rescore_all_users_matches_scalar(weights, thresholds):
+    rng = random.Random(0)
+    user_data = {f'user-{i}': sample_user(rng) for i in range(5000)}
+    user_data['no-tests'] = {}
+
+    results = rescore_all_users(user_data, weights, thresholds)
+
+    for user_id, data in user_data.items():
+        expected = calculate_fatigue_score(data, weights, thresholds)
+        assert json.dumps(results[user_id]) == json.dumps(expected), user_id
+
+def test_rescore_all_users_keeps_float_blink_rate_scores():
+    thresholds = {'blink_rate_bounds': [10, 15, 20], 'blink_rate_scores': [80.5, 60, 40, 20], 'high': 70, 'moderate': 40}
+    user_data = {'low': {'eye': {'blink_rate': 5}}, 'high': {'eye': {'blink_rate': 25}}}
+
+    results = rescore_all_users(user_data, thresholds=thresholds)
+
+    assert json.dumps(results['low']['test_scores']) == '{"eye": 80.5}'
+    assert json.dumps(results['high']['test_scores']) == '{"eye": 20}'
+    for user_id, data in user_data.items():
+        assert results[user_id] == calculate_fatigue_score(data, thresholds=thresholds)
+
+def test_rescore_all_users_rejects_non_numeric_metrics():
+    data = {'typing': {'wpm': '50'}}
+    with pytest.raises(TypeError):
+        calculate_fatigue_score(data)
+    with pytest.raises(TypeError):
+        rescore_all_users({'user': data})
+
+# Re-scoring prebuilt columns for several weight sets should be much faster than
+# running calculate_fatigue_score over every user for each set
+def test_bulk_rescoring_is_faster_than_scalar_loop():
+    rng = random.Random(1)
+    user_data = {f'user-{i}': sample_user(rng) for i in range(50000)}
+    columns = build_fatigue_columns(user_data)
+
+    start_time = time.perf_counter()
+    scalar_results = [
+        [calculate_fatigue_score(data, weights)['fatigue_score'] for data in user_data.values()]
+        for weights in custom_weights
+    ]
+    scalar_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    bulk_results = [score_fatigue_columns(columns, weights)['fatigue_score'] for weights in custom_weights]
+    bulk_time = time.perf_counter() - start_time
+
+    print(f'scalar loop {scalar_time:.3f}s, bulk re-scoring {bulk_time:.3f}s, {scalar_time / bulk_time:.1f}x faster')
+    for scalar_scores, bulk_scores in zip(scalar_results, bulk_results):
+        assert bulk_scores.tolist() == scalar_scores
+    assert bulk_time * 5 < scalar_time